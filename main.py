@@ -2,28 +2,35 @@
 主程序入口
 """
 import asyncio
-import logging
-from src.config import Config
-from src.discord_bot import DiscordBot
-
-logger = logging.getLogger(__name__)
-
-async def run_bot(config: Config):
-    """运行 Discord 机器人"""
-    bot = DiscordBot(config)
-    await bot.start(config.discord.token)
+import sys
+from src._log import logger
+from src.config import get_config
+from src.discord_bot import run_bot
 
 def main():
     """主函数"""
     try:
         # 加载配置
-        config = Config.load()
+        config = get_config()
+        
+        # 优先使用 uvloop 事件循环（Windows 等不支持的平台回退到默认事件循环）
+        try:
+            import uvloop
+        except ImportError:
+            uvloop = None
         
         # 运行机器人
-        asyncio.run(run_bot(config))
+        if uvloop is not None and sys.version_info >= (3, 11):
+            # 通过 loop_factory 直接创建 uvloop，无需修改全局事件循环策略
+            with asyncio.Runner(loop_factory=uvloop.new_event_loop) as runner:
+                runner.run(run_bot(config))
+        else:
+            if uvloop is not None:
+                uvloop.install()
+            asyncio.run(run_bot(config))
     except Exception as e:
         logger.error(f"程序运行出错: {str(e)}")
         raise
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main() 
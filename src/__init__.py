@@ -3,7 +3,12 @@ Pop Mart Watch Bot
 一个用于监控 Pop Mart 商品库存的 Discord 机器人
 """
 
-from src.discord_bot import run_bot
-
 __version__ = "1.0.0"
-__author__ = "Your Name" 
\ No newline at end of file
+__author__ = "Your Name"
+
+def __getattr__(name):
+    # 延迟导入，避免 `import src.config` 时连带加载 discord/selenium 等重量级模块
+    if name == "run_bot":
+        from src.discord_bot import run_bot
+        return run_bot
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
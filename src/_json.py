@@ -0,0 +1,22 @@
+"""
+JSON 序列化模块，优先使用 orjson，未安装时回退到标准库 json
+"""
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def dumps(data: Any) -> bytes:
+    """序列化为带缩进的 UTF-8 JSON 字节串"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    return json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+
+def loads(raw: bytes) -> Any:
+    """从 JSON 字节串或字符串反序列化"""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
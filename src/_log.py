@@ -0,0 +1,6 @@
+"""
+日志模块，提供整个包共用的日志记录器
+"""
+import logging
+
+logger = logging.getLogger('popmart_watch')
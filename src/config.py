@@ -2,25 +2,94 @@
 配置模块，负责加载和管理配置
 """
 import os
+import functools
+import queue
+import atexit
+import threading
 import yaml
 import logging.config
-from dataclasses import dataclass
+import logging.handlers
+from dataclasses import dataclass, field
 from typing import List, Dict, Any
 from copy import deepcopy
 
-logger = logging.getLogger(__name__)
+from src import _json
+from src._log import logger
+
+try:
+    from yaml import CSafeLoader as Loader
+except ImportError:
+    from yaml import SafeLoader as Loader
+
+class BufferedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    带写缓冲的滚动日志处理器
+    WARNING 及以上级别立即刷新，其余记录由后台线程定时刷新，减少 write() 系统调用
+    """
+
+    def __init__(self, *args, buffer_size: int = 64 * 1024, flush_interval: float = 1.0, **kwargs):
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self._flush_now = True
+        self._size = 0
+        self._pending_size = 0
+        self._closing = threading.Event()
+        super().__init__(*args, **kwargs)
+
+        self._flusher = threading.Thread(target=self._flush_loop, name='log-flusher', daemon=True)
+        self._flusher.start()
+
+    def _open(self):
+        """以较大的缓冲区打开日志文件，并记录当前文件大小"""
+        stream = open(self.baseFilename, self.mode, buffering=self.buffer_size,
+                      encoding=self.encoding, errors=self.errors)
+        self._size = os.path.getsize(self.baseFilename)
+        return stream
+
+    def shouldRollover(self, record) -> bool:
+        """根据累计写入量判断是否需要滚动，避免 seek/tell 强制刷新缓冲区"""
+        if self.stream is None:
+            self.stream = self._open()
+        msg = f"{self.format(record)}{self.terminator}"
+        self._pending_size = len(msg.encode(self.encoding or 'utf-8', errors='replace'))
+        return self.maxBytes > 0 and self._size + self._pending_size >= self.maxBytes
+
+    def emit(self, record):
+        """写入日志记录，仅在 WARNING 及以上级别时立即刷新"""
+        self._flush_now = record.levelno >= logging.WARNING
+        try:
+            super().emit(record)
+            self._size += self._pending_size
+        finally:
+            self._flush_now = True
+
+    def flush(self):
+        if self._flush_now:
+            super().flush()
+
+    def _flush_loop(self):
+        """定时刷新缓冲区"""
+        while not self._closing.wait(self.flush_interval):
+            super().flush()
+
+    def close(self):
+        self._closing.set()
+        super().close()
 
 @dataclass
 class DiscordConfig:
     token: str
     channel_id: int
     guild_id: int
+    notification_channels: List[int] = field(default_factory=list)
+    global_commands: bool = False
 
 @dataclass
 class MonitorConfig:
     check_interval: int
     request_delay: int
     allowed_domains: List[str]
+    max_concurrency: int = 2
 
 @dataclass
 class StorageConfig:
@@ -43,25 +112,67 @@ class Config:
     storage: StorageConfig
     logging: LoggingConfig
 
+    # 日志目录是否已创建（类级别标记，避免重复的 stat/mkdir 系统调用）
+    _log_dir_ensured = False
+
+    @staticmethod
+    def _read_config_data(config_path: str) -> Dict[str, Any]:
+        """
+        读取配置数据
+        优先使用与 YAML 同目录的 JSON 缓存，缓存与 YAML 文件不一致时重新解析 YAML 并写回缓存
+        """
+        config_dir, config_name = os.path.split(config_path)
+        cache_path = os.path.join(config_dir, f".{config_name}.json")
+
+        # 缓存中记录 YAML 文件的修改时间（纳秒）和大小，必须完全一致才使用
+        # 不比较新旧：用 cp -p、rsync -a 或备份恢复替换的文件可能带有更早的修改时间
+        yaml_stat = os.stat(config_path)
+        source = [yaml_stat.st_mtime_ns, yaml_stat.st_size]
+        try:
+            with open(cache_path, 'rb') as f:
+                cache = _json.loads(f.read())
+            if isinstance(cache, dict) and cache.get('source') == source:
+                return cache['data']
+        except (OSError, ValueError, KeyError):
+            pass
+
+        with open(config_path, 'r', encoding='utf-8') as f:
+            config_data = yaml.load(f, Loader=Loader)
+
+        # 原子写入缓存，失败不影响正常加载
+        try:
+            tmp_path = f"{cache_path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(_json.dumps({'source': source, 'data': config_data}))
+            # 缓存中包含 Discord token 等明文配置，权限与 YAML 文件保持一致
+            os.chmod(tmp_path, yaml_stat.st_mode & 0o777)
+            os.replace(tmp_path, cache_path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"写入配置缓存失败: {str(e)}")
+
+        return config_data
+
     @staticmethod
     def load(config_path: str = "config.yaml") -> 'Config':
         """加载配置文件"""
         try:
             # 读取配置文件
-            with open(config_path, 'r', encoding='utf-8') as f:
-                config_data = yaml.safe_load(f)
+            config_data = Config._read_config_data(config_path)
 
             # 创建配置对象
             discord_config = DiscordConfig(
                 token=config_data['discord']['token'],
                 channel_id=config_data['discord']['channel_id'],
-                guild_id=config_data['discord']['guild_id']
+                guild_id=config_data['discord']['guild_id'],
+                notification_channels=config_data['discord'].get('notification_channels') or [],
+                global_commands=config_data['discord'].get('global_commands', False)
             )
 
             monitor_config = MonitorConfig(
                 check_interval=config_data['monitor']['check_interval'],
                 request_delay=config_data['monitor']['request_delay'],
-                allowed_domains=config_data['monitor']['allowed_domains']
+                allowed_domains=config_data['monitor']['allowed_domains'],
+                max_concurrency=config_data['monitor'].get('max_concurrency', 2)
             )
 
             storage_config = StorageConfig(
@@ -86,7 +197,9 @@ class Config:
             )
 
             # 配置日志
-            os.makedirs(os.path.dirname(config.logging.file), exist_ok=True)
+            if not Config._log_dir_ensured:
+                os.makedirs(os.path.dirname(config.logging.file), exist_ok=True)
+                Config._log_dir_ensured = True
             
             logging_config = {
                 'version': 1,
@@ -99,7 +212,7 @@ class Config:
                 'handlers': {
                     'file': {
                         'level': config.logging.level,
-                        'class': 'logging.handlers.RotatingFileHandler',
+                        'class': 'src.config.BufferedRotatingFileHandler',
                         'filename': config.logging.file,
                         'maxBytes': config.logging.max_size,
                         'backupCount': config.logging.backup_count,
@@ -134,7 +247,20 @@ class Config:
                 }
 
             logging.config.dictConfig(logging_config)
-            logger = logging.getLogger(__name__)
+
+            # 实际的处理器交给后台线程，事件循环中只做入队，不阻塞在磁盘写入上
+            log_queue = queue.Queue(-1)
+            queue_handler = logging.handlers.QueueHandler(log_queue)
+            listener = logging.handlers.QueueListener(
+                log_queue,
+                *logging.getLogger().handlers,
+                respect_handler_level=True
+            )
+            for logger_name in [''] + list(config.logging.third_party_levels):
+                logging.getLogger(logger_name).handlers = [queue_handler]
+            listener.start()
+            atexit.register(listener.stop)
+
             logger.info("配置加载成功")
 
             return config
@@ -143,5 +269,7 @@ class Config:
             print(f"加载配置文件失败: {str(e)}")
             raise
 
-# 创建全局配置实例
-config = Config.load() 
\ No newline at end of file
+@functools.lru_cache(maxsize=None)
+def get_config(config_path: str = "config.yaml") -> Config:
+    """获取配置实例，同一路径只加载一次"""
+    return Config.load(config_path)
@@ -2,238 +2,405 @@
 Discord 机器人模块，处理 Discord 相关功能
 """
 import asyncio
-import logging
-import traceback
-from datetime import datetime
+import hashlib
+import random
+import re
+import signal
+import time
 
 import discord
 from discord import app_commands
 from discord.ext import tasks
+from discord.utils import utcnow
 import aiohttp
-from typing import Optional, Dict, List, Any
-from urllib.parse import urlparse
+from typing import Optional, Dict, List, Tuple, Any, ClassVar, Final
+from urllib.parse import urlsplit
 import json
 import os
 
+from src._log import logger
 from src.config import Config
 from src.monitor import Monitor, ProductStatus
 
-logger = logging.getLogger(__name__)
+# 命令回复与嵌入消息中使用的固定文本
+MSG_ALREADY_WATCHED: Final = "该商品已经在监控列表中"
+MSG_NOT_WATCHED: Final = "该商品不在监控列表中"
+MSG_UNSUPPORTED_IMAGE: Final = "不支持的图片格式。支持的格式：jpg、jpeg、png、gif、webp"
+MSG_ADD_FAILED: Final = "添加商品失败，可能已经在监控列表中"
+MSG_REMOVED: Final = "已从监控列表移除商品"
+MSG_LIST_EMPTY: Final = "监控列表为空"
+TITLE_ADDED: Final = "已添加商品到监控列表"
+TITLE_LIST: Final = "正在监控的商品"
+STATUS_IN_STOCK_TEXT: Final = "可购买 ✅"
+STATUS_SOLD_OUT_TEXT: Final = "已售罄 ❌"
+FIELD_PRODUCT_ID: Final = "商品 ID"
+FIELD_URL: Final = "URL"
+FIELD_STATUS_CHANGE: Final = "状态变化"
+FIELD_PRICE: Final = "价格"
+
+# 支持的图片格式（扩展名后可以带查询参数）
+_IMAGE_EXT_RE = re.compile(r'\.(?:jpe?g|png|gif|webp|bmp)(?:\?|$)', re.IGNORECASE)
+
+async def _retry(fn, attempts: int = 3, base: float = 5):
+    """按指数退避重试异步调用，权限错误不重试"""
+    delay = base
+    for attempt in range(1, attempts + 1):
+        try:
+            return await fn()
+        except discord.errors.Forbidden:
+            raise
+        except Exception as e:
+            if attempt == attempts:
+                raise
+            logger.warning(f"第 {attempt} 次调用失败: {str(e)}，{delay} 秒后重试")
+            await asyncio.sleep(delay)
+            delay *= 2
+
+class TokenBucket:
+    """令牌桶限流器，用于控制向同一频道发送消息的速率"""
+    
+    def __init__(self, rate: int, per: float):
+        self.rate = rate
+        self.per = per
+        self._tokens = float(rate)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self):
+        """获取一个令牌，令牌不足时等待补充"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate / self.per)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) * self.per / self.rate)
+    
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+# 斜杠命令在模块级定义，只创建一次；通过 interaction.client 访问机器人实例
+@app_commands.command(name="watch", description="添加商品到监控列表")
+@app_commands.describe(
+    url="商品页面的 URL",
+    icon_url="商品图片的 URL（可选，支持 jpg/jpeg/png/gif/webp）"
+)
+async def watch(interaction: discord.Interaction, url: str, icon_url: str = None):
+    bot: "DiscordBot" = interaction.client
+    try:
+        # 先确认交互，后续处理不受 3 秒响应时限约束
+        await interaction.response.defer()
+
+        # 同一商品的不同写法（大小写、片段、跟踪参数）统一为同一个键
+        url = Monitor.normalize_url(url)
+
+        # 已在监控列表中时直接返回，无需再做校验和解析
+        if url in bot.monitor.monitored_items:
+            await interaction.followup.send(MSG_ALREADY_WATCHED)
+            return
+
+        # 验证 URL
+        if not bot.classify_url(url)[0]:
+            await interaction.followup.send(
+                f"不支持的域名。允许的域名: {bot._allowed_hosts_text}"
+            )
+            return
+
+        # 验证图片 URL（如果提供）
+        if icon_url and not bot.classify_url(icon_url)[1]:
+            await interaction.followup.send(MSG_UNSUPPORTED_IMAGE)
+            return
+
+        # 解析商品信息
+        try:
+            product_info = Monitor.parse_product_info(url)
+        except ValueError as e:
+            await interaction.followup.send(f"错误: {str(e)}")
+            return
+
+        # 添加到监控列表
+        success = await bot.monitor.add_monitored_item(
+            url, product_info['name'], icon_url, product_id=product_info['id']
+        )
+        if success:
+            # 构建嵌入消息
+            embed = bot._item_embed(
+                title=TITLE_ADDED,
+                description=product_info['name'],
+                color=bot.COLOR_ADDED,
+                fields=[
+                    {'name': FIELD_PRODUCT_ID, 'value': product_info['id'], 'inline': True},
+                    {'name': FIELD_URL, 'value': url, 'inline': False}
+                ],
+                icon_url=icon_url
+            )
+
+            await interaction.followup.send(embed=embed)
+            logger.info(f"添加商品到监控列表: {product_info['name']} (ID: {product_info['id']})")
+        else:
+            await interaction.followup.send(MSG_ADD_FAILED)
+
+    except Exception as e:
+        logger.error(f"添加监控商品时出错: {str(e)}")
+        await interaction.followup.send(f"添加监控商品时出错: {str(e)}")
+
+@app_commands.command(name="unwatch", description="从监控列表中移除商品")
+@app_commands.describe(
+    url="要移除的商品 URL"
+)
+async def unwatch(interaction: discord.Interaction, url: str):
+    bot: "DiscordBot" = interaction.client
+    try:
+        # 先确认交互，后续处理不受 3 秒响应时限约束
+        await interaction.response.defer()
+
+        url = Monitor.normalize_url(url)
+        if url not in bot.monitor.monitored_items:
+            await interaction.followup.send(MSG_NOT_WATCHED)
+            return
+
+        success = await bot.monitor.remove_monitored_item(url)
+        if success:
+            await interaction.followup.send(MSG_REMOVED)
+            logger.info(f"从监控列表移除商品: {url}")
+        else:
+            await interaction.followup.send(MSG_NOT_WATCHED)
+    except Exception as e:
+        logger.error(f"移除监控商品时出错: {str(e)}")
+        await interaction.followup.send(f"移除监控商品时出错: {str(e)}")
+
+@app_commands.command(name="list", description="显示所有正在监控的商品")
+async def list_items(interaction: discord.Interaction):
+    bot: "DiscordBot" = interaction.client
+    try:
+        await interaction.response.defer()
+
+        if not bot.monitor.monitored_items:
+            await interaction.followup.send(MSG_LIST_EMPTY)
+            return
+
+        # 监控列表未变化时复用上次生成的嵌入消息，只更新时间戳
+        if bot._list_cache is None or bot._list_cache[0] != bot.monitor.version:
+            bot._list_cache = (bot.monitor.version, bot._render_list())
+        batches = bot._list_cache[1]
+        now = utcnow()
+        for batch in batches:
+            for embed in batch:
+                embed.timestamp = now
+
+        # 第一条消息带上总数，其余消息按页码顺序依次发送
+        await interaction.followup.send(
+            content=f"共 {len(bot.monitor.monitored_items)} 个商品", embeds=batches[0]
+        )
+        for batch in batches[1:]:
+            await interaction.followup.send(embeds=batch)
+
+    except Exception as e:
+        logger.error(f"显示监控列表时出错: {str(e)}")
+        await interaction.followup.send(f"显示监控列表时出错: {str(e)}")
+
+@app_commands.command(name="status", description="显示机器人状态")
+async def status(interaction: discord.Interaction):
+    bot: "DiscordBot" = interaction.client
+    try:
+        # 先确认交互，后续处理不受 3 秒响应时限约束
+        await interaction.response.defer()
+
+        await interaction.followup.send(
+            f"机器人状态: 正常运行中\n"
+            f"监控商品数量: {len(bot.monitor.monitored_items)}\n"
+            f"检查间隔: {bot.check_interval} 秒"
+        )
+    except Exception as e:
+        logger.error(f"显示状态时出错: {str(e)}")
+        await interaction.followup.send(f"显示状态时出错: {str(e)}")
 
 class DiscordBot(discord.Client):
     """Discord 机器人类"""
     
+    # 监控任务异常退出后的重启退避时间（秒）
+    MONITOR_BACKOFF_BASE = 60
+    MONITOR_BACKOFF_MAX = 600
+    
+    # 常用的嵌入消息颜色值，避免每次调用 discord.Color 的工厂方法
+    COLOR_ADDED = discord.Color.green().value
+    COLOR_LIST = discord.Color.blue().value
+    
+    # 各状态的通知文本
+    STATUS_MESSAGES: ClassVar[Dict[ProductStatus, str]] = {
+        ProductStatus.IN_STOCK: "🟢 商品已上架！",
+        ProductStatus.SOLD_OUT: "🔴 商品已售罄",
+        ProductStatus.COMING_SOON: "🟡 商品即将发售",
+        ProductStatus.OFF_SHELF: "⚫ 商品已下架",
+        ProductStatus.UNKNOWN: "❓ 商品状态未知"
+    }
+    
+    # 各状态对应的嵌入消息颜色
+    STATUS_COLORS: ClassVar[Dict[str, discord.Color]] = {
+        'in_stock': discord.Color.green(),
+        'sold_out': discord.Color.red(),
+        'coming_soon': discord.Color.gold(),
+        'off_shelf': discord.Color.dark_gray(),
+        'unknown': discord.Color.light_gray()
+    }
+    
+    # /list 每个嵌入消息列出的商品数量
+    LIST_PAGE_SIZE = 10
+    
     def __init__(self, config: Config):
         """初始化 Discord 机器人"""
         intents = discord.Intents.default()
         super().__init__(intents=intents)
         
         self.config = config
+        self.check_interval = config.monitor.check_interval
         self.tree = app_commands.CommandTree(self)
-        self.monitor = Monitor()
+        self._guild_obj = discord.Object(id=config.discord.guild_id)
+        self.monitor: Optional[Monitor] = None  # 在 setup_hook 中创建并加载监控列表
+        self.session: Optional[aiohttp.ClientSession] = None
+        
+        # 预编译允许的域名（含子域名），校验时只需一次正则匹配
+        self._allowed_host_re = re.compile(
+            r"(?:^|\.)(?:%s)$" % "|".join(map(re.escape, config.monitor.allowed_domains)),
+            re.IGNORECASE
+        )
+        self._allowed_hosts_text = ', '.join(config.monitor.allowed_domains)
+        
+        # /list 嵌入消息模板，每次调用只需复制
+        self._list_embed_template = discord.Embed(
+            title=TITLE_LIST,
+            color=self.COLOR_LIST
+        )
+        
+        # /list 嵌入消息缓存：(监控列表版本号, 分组后的嵌入消息)
+        self._list_cache: Optional[Tuple[int, List[List[discord.Embed]]]] = None
+        
+        # 嵌入消息的页脚文本只依赖配置，初始化时生成一次
+        self._footer_text = f"监控间隔: {self.check_interval}秒 | 持续监控中..."
+        
+        # 上次同步的命令哈希保存位置
+        self._command_sync_file = os.path.join(Monitor.data_dir, 'command_sync.json')
+        
+        # 接收状态通知的频道 ID（主频道在前，去重保序）
+        self.notification_channels: List[int] = list(dict.fromkeys(
+            [config.discord.channel_id, *config.discord.notification_channels]
+        ))
+        
+        # 通知频道对象缓存，在 on_ready 中解析，频道删除或更新时同步
+        self._channel_cache: Dict[int, discord.abc.Messageable] = {}
+        
+        # 监控任务出错后的重启等待时间（秒）
+        self._monitor_backoff = self.MONITOR_BACKOFF_BASE
+        
+        # 每个频道一个令牌桶，按 Discord 的频道限流（5 条/5 秒）发送通知
+        self._send_buckets: Dict[int, TokenBucket] = {}
         
         # 注册命令
         self.setup_commands()
         
-    @staticmethod
-    def is_valid_image_url(url: str) -> bool:
-        """验证图片 URL 格式是否合法"""
-        if not url:
-            return False
-            
-        # 支持的图片格式
-        valid_extensions = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp')
+    def classify_url(self, url: str) -> Tuple[bool, bool]:
+        """
+        一次解析同时判断 URL 的两个属性
+        返回 (域名是否在允许列表中, 路径是否为支持的图片格式)
+        """
+        parts = urlsplit(url)
+        host = parts.hostname
+        return (
+            bool(host and self._allowed_host_re.search(host)),
+            bool(_IMAGE_EXT_RE.search(parts.path))
+        )
+
+    def _item_embed(self, *, title: str, description: str, color: int, fields: List[Dict[str, Any]],
+                    url: Optional[str] = None, icon_url: Optional[str] = None,
+                    timestamp: Optional[str] = None) -> discord.Embed:
+        """构建商品相关的嵌入消息（统一页脚与缩略图）"""
+        data = {
+            'title': title,
+            'description': description,
+            'color': color,
+            'fields': fields,
+            'footer': {'text': self._footer_text}
+        }
+        if url:
+            data['url'] = url
+        if timestamp:
+            data['timestamp'] = timestamp
+        embed = discord.Embed.from_dict(data)
+        if icon_url:
+            embed.set_thumbnail(url=icon_url)
+        return embed
+
+    def _render_list(self) -> List[List[discord.Embed]]:
+        """
+        生成 /list 的嵌入消息，按单条消息的限制分组
+        每个嵌入消息最多列出 LIST_PAGE_SIZE 个商品
+        """
+        items = tuple(self.monitor.monitored_items.items())
+        embeds = []
+        for start in range(0, len(items), self.LIST_PAGE_SIZE):
+            embed = self._list_embed_template.copy()
+            lines = []
+            for url, item in items[start:start + self.LIST_PAGE_SIZE]:
+                status = STATUS_IN_STOCK_TEXT if item.get('last_status') == "in_stock" else STATUS_SOLD_OUT_TEXT
+                lines.append(f"**{item['name']} (ID: {item['id']})** — {status}\n{url}")
+
+                # 设置图片（使用本页第一个商品的图片作为缩略图）
+                if item.get('icon_url') and not embed.thumbnail:
+                    embed.set_thumbnail(url=item['icon_url'])
+            embed.description = "\n".join(lines)[:4096]
+            embeds.append(embed)
         
-        # 检查 URL 是否以支持的图片格式结尾（不区分大小写）
-        return url.lower().endswith(valid_extensions)
+        # 多页时在标题中标注页码
+        if len(embeds) > 1:
+            for page, embed in enumerate(embeds, 1):
+                embed.title = f"{TITLE_LIST}（第 {page}/{len(embeds)} 页）"
+
+        # 单条消息最多 10 个嵌入、总长度不超过 6000 字符，按此合并以减少请求次数
+        batches, batch_size = [[]], 0
+        for embed in embeds:
+            if batches[-1] and (len(batches[-1]) == 10 or batch_size + len(embed) > 6000):
+                batches.append([])
+                batch_size = 0
+            batches[-1].append(embed)
+            batch_size += len(embed)
+        return batches
 
     def setup_commands(self):
         """设置斜杠命令"""
-        # 清除现有命令
-        self.tree.clear_commands(guild=discord.Object(id=self.config.discord.guild_id))
-        
-        @self.tree.command(
-            name="watch",
-            description="添加商品到监控列表",
-            guild=discord.Object(id=self.config.discord.guild_id)  # 将命令注册到特定服务器
-        )
-        @app_commands.describe(
-            url="商品页面的 URL",
-            icon_url="商品图片的 URL（可选，支持 jpg/jpeg/png/gif/webp）"
-        )
-        async def watch(interaction: discord.Interaction, url: str, icon_url: str = None):
-            try:
-                # 验证 URL
-                if not any(domain in url for domain in self.config.monitor.allowed_domains):
-                    await interaction.response.send_message(
-                        f"不支持的域名。允许的域名: {', '.join(self.config.monitor.allowed_domains)}"
-                    )
-                    return
-                
-                # 验证图片 URL（如果提供）
-                if icon_url and not self.is_valid_image_url(icon_url):
-                    await interaction.response.send_message(
-                        "不支持的图片格式。支持的格式：jpg、jpeg、png、gif、webp"
-                    )
-                    return
-                
-                # 解析商品信息
-                try:
-                    product_info = Monitor.parse_product_info(url)
-                except ValueError as e:
-                    await interaction.response.send_message(f"错误: {str(e)}")
-                    return
-                
-                # 添加到监控列表
-                success = await self.monitor.add_monitored_item(url, product_info['name'], icon_url)
-                if success:
-                    # 构建嵌入消息
-                    embed = discord.Embed(
-                        title="已添加商品到监控列表",
-                        description=product_info['name'],
-                        color=discord.Color.green()
-                    )
-                    embed.add_field(name="商品 ID", value=product_info['id'], inline=True)
-                    embed.add_field(name="URL", value=url, inline=False)
-                    
-                    # 设置图片
-                    if icon_url:
-                        try:
-                            embed.set_thumbnail(url=icon_url)
-                            logger.info(f"成功设置商品图片: {icon_url}")
-                        except Exception as e:
-                            logger.warning(f"设置商品图片失败: {str(e)}")
-                    
-                    await interaction.response.send_message(embed=embed)
-                    logger.info(f"添加商品到监控列表: {product_info['name']} (ID: {product_info['id']})")
-                else:
-                    await interaction.response.send_message("添加商品失败，可能已经在监控列表中")
-                
-            except Exception as e:
-                logger.error(f"添加监控商品时出错: {str(e)}")
-                await interaction.response.send_message(f"添加监控商品时出错: {str(e)}")
-        
-        @self.tree.command(
-            name="unwatch",
-            description="从监控列表中移除商品",
-            guild=discord.Object(id=self.config.discord.guild_id)  # 将命令注册到特定服务器
-        )
-        @app_commands.describe(
-            url="要移除的商品 URL"
-        )
-        async def unwatch(interaction: discord.Interaction, url: str):
-            try:
-                success = await self.monitor.remove_monitored_item(url)
-                if success:
-                    await interaction.response.send_message(f"已从监控列表移除商品")
-                    logger.info(f"从监控列表移除商品: {url}")
-                else:
-                    await interaction.response.send_message("该商品不在监控列表中")
-            except Exception as e:
-                logger.error(f"移除监控商品时出错: {str(e)}")
-                await interaction.response.send_message(f"移除监控商品时出错: {str(e)}")
+        # 命令在模块级定义，这里只负责注册到特定服务器（命令树是新建的，无需先清除）
+        for command in (watch, unwatch, list_items, status):
+            self.tree.add_command(command, guild=self._guild_obj)
         
-        @self.tree.command(
-            name="list",
-            description="显示所有正在监控的商品",
-            guild=discord.Object(id=self.config.discord.guild_id)  # 将命令注册到特定服务器
-        )
-        async def list_items(interaction: discord.Interaction):
-            try:
-                await interaction.response.defer()
-                
-                if not self.monitor.monitored_items:
-                    await interaction.followup.send("监控列表为空")
-                    return
-                
-                # 构建嵌入消息
-                embed = discord.Embed(
-                    title="正在监控的商品",
-                    description=f"共 {len(self.monitor.monitored_items)} 个商品",
-                    color=discord.Color.blue()
-                )
-                
-                # 添加每个商品的信息
-                for url, item in self.monitor.monitored_items.items():
-                    try:
-                        product_info = Monitor.parse_product_info(url)
-                        status = "可购买 ✅" if item.get('last_status') == "in_stock" else "已售罄 ❌"
-                        embed.add_field(
-                            name=f"{item['name']} (ID: {product_info['id']})",
-                            value=f"状态: {status}\n{url}",
-                            inline=False
-                        )
-                        
-                        # 设置图片（使用第一个商品的图片作为消息的缩略图）
-                        if item.get('icon_url') and not embed.thumbnail:
-                            embed.set_thumbnail(url=item['icon_url'])
-                            
-                    except:
-                        status = "可购买 ✅" if item.get('last_status') == "in_stock" else "已售罄 ❌"
-                        embed.add_field(
-                            name=item['name'],
-                            value=f"状态: {status}\n{url}",
-                            inline=False
-                        )
-                
-                await interaction.followup.send(embed=embed)
-                
-            except Exception as e:
-                logger.error(f"显示监控列表时出错: {str(e)}")
-                await interaction.followup.send(f"显示监控列表时出错: {str(e)}")
-        
-        @self.tree.command(
-            name="status",
-            description="显示机器人状态",
-            guild=discord.Object(id=self.config.discord.guild_id)  # 将命令注册到特定服务器
-        )
-        async def status(interaction: discord.Interaction):
-            try:
-                await interaction.response.send_message(
-                    f"机器人状态: 正常运行中\n"
-                    f"监控商品数量: {len(self.monitor.monitored_items)}\n"
-                    f"检查间隔: {self.config.monitor.check_interval} 秒"
-                )
-            except Exception as e:
-                logger.error(f"显示状态时出错: {str(e)}")
-                await interaction.response.send_message(f"显示状态时出错: {str(e)}")
-                
         logger.info("命令设置完成")
     
     async def setup_hook(self):
         """设置钩子"""
         logger.info("初始化 Discord 机器人...")
         
-        # 同步命令到服务器
+        # 创建共享的 HTTP 会话，所有商品请求复用同一连接池（保持连接、缓存 DNS）
+        self.session = Monitor.make_session()
+        
+        # 在后台线程中加载监控列表，不阻塞机器人对象的创建
+        self.monitor = await Monitor.create(self.config, session=self.session)
+        
+        # 启动状态定期保存任务，并按配置设置监控间隔
+        self.flush_state.start()
+        self.monitor_products.change_interval(seconds=self.check_interval)
+        
+        # 同步命令到服务器（命令定义未变化时跳过，节省 API 调用）
         try:
-            logger.info(f"开始同步命令到服务器 {self.config.discord.guild_id}")
-            
-            # 同步命令到指定服务器
-            logger.info("同步命令到指定服务器...")
-            await self.tree.sync(guild=discord.Object(id=self.config.discord.guild_id))
-            guild_commands = await self.tree.fetch_commands(guild=discord.Object(id=self.config.discord.guild_id))
-            logger.info(f"服务器命令同步完成，共 {len(guild_commands)} 个命令")
-            
-            # 同步全局命令
-            logger.info("同步全局命令...")
-            await self.tree.sync()
-            global_commands = await self.tree.fetch_commands()
-            logger.info(f"全局命令同步完成，共 {len(global_commands)} 个命令")
-            
-            # 输出所有已注册的命令
-            logger.info("已注册的命令：")
-            if guild_commands:
-                for command in guild_commands:
-                    logger.info(f"[服务器] /{command.name} - {command.description}")
-            else:
-                logger.warning("服务器中没有注册的命令")
-                
-            if global_commands:
-                for command in global_commands:
-                    logger.info(f"[全局] /{command.name} - {command.description}")
+            signature = self._command_signature()
+            if signature == await asyncio.to_thread(self._load_command_signature):
+                logger.info("命令定义未变化，跳过同步")
             else:
-                logger.warning("没有注册的全局命令")
-                
+                await self._sync_commands()
+                await asyncio.to_thread(self._save_command_signature, signature)
         except discord.errors.Forbidden as e:
             logger.error(f"权限错误: {str(e)}")
             logger.error("请确保机器人有 applications.commands 权限")
@@ -242,98 +409,250 @@ class DiscordBot(discord.Client):
             logger.error(f"HTTP 错误: {str(e)}")
             logger.error("可能是 Discord API 限制或网络问题")
             return
-        except Exception as e:
-            logger.error(f"同步命令时出错: {str(e)}")
-            logger.error(f"错误类型: {type(e).__name__}")
-            logger.error(f"错误详情: {traceback.format_exc()}")
+        except Exception:
+            logger.exception("同步命令时出错")
             return
         
         logger.info("机器人设置完成")
     
+    async def _sync_commands(self):
+        """同步命令到 Discord 并输出已注册的命令"""
+        logger.info(f"开始同步命令到服务器 {self.config.discord.guild_id}")
+
+        # 同步命令到指定服务器
+        logger.info("同步命令到指定服务器...")
+        await _retry(lambda: self.tree.sync(guild=self._guild_obj))
+        guild_commands = await self.tree.fetch_commands(guild=self._guild_obj)
+        logger.info(f"服务器命令同步完成，共 {len(guild_commands)} 个命令")
+
+        # 同步全局命令（全局命令传播慢且限流严格，单服务器机器人默认跳过）
+        global_commands = None
+        if self.config.discord.global_commands:
+            logger.info("同步全局命令...")
+            await _retry(lambda: self.tree.sync())
+            global_commands = await self.tree.fetch_commands()
+            logger.info(f"全局命令同步完成，共 {len(global_commands)} 个命令")
+        else:
+            logger.info("未启用 global_commands，跳过全局命令同步")
+
+        # 输出所有已注册的命令
+        logger.info("已注册的命令：")
+        if guild_commands:
+            for command in guild_commands:
+                logger.info(f"[服务器] /{command.name} - {command.description}")
+        else:
+            logger.warning("服务器中没有注册的命令")
+
+        if global_commands:
+            for command in global_commands:
+                logger.info(f"[全局] /{command.name} - {command.description}")
+        elif global_commands is not None:
+            logger.warning("没有注册的全局命令")
+    
+    def _command_signature(self) -> str:
+        """计算本地命令定义的哈希，用于判断是否需要重新同步"""
+        signature = [
+            (
+                command.name,
+                command.description,
+                [(p.name, p.description, p.required, str(p.type)) for p in command.parameters]
+            )
+            for command in sorted(self.tree.get_commands(guild=self._guild_obj), key=lambda c: c.name)
+        ]
+        payload = json.dumps(
+            [self.config.discord.guild_id, self.config.discord.global_commands, signature],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def _load_command_signature(self) -> Optional[str]:
+        """读取上次同步时的命令哈希"""
+        try:
+            with open(self._command_sync_file, 'r', encoding='utf-8') as f:
+                return json.load(f).get('signature')
+        except (OSError, ValueError):
+            return None
+    
+    def _save_command_signature(self, signature: str):
+        """保存本次同步的命令哈希"""
+        try:
+            with open(self._command_sync_file, 'w', encoding='utf-8') as f:
+                json.dump({'signature': signature}, f)
+        except OSError as e:
+            logger.warning(f"保存命令同步状态失败: {str(e)}")
+    
+    @tasks.loop(seconds=5)
+    async def flush_state(self):
+        """定期保存监控状态的变化"""
+        await self.monitor.flush()
+    
+    @flush_state.error
+    async def on_flush_error(self, error: BaseException):
+        """定期保存任务异常退出时记录错误，由 on_ready 负责重新启动"""
+        logger.error("状态保存任务出错", exc_info=error)
+    
+    async def close(self):
+        """关闭机器人，保存未写入的状态并释放共享的 HTTP 会话"""
+        # 取消后台任务并等待其退出（最多 10 秒），避免中断进行中的写入
+        tasks_to_wait = {
+            task for task in (self.monitor_products.get_task(), self.flush_state.get_task())
+            if task is not None and not task.done()
+        }
+        self.monitor_products.cancel()
+        self.flush_state.cancel()
+        if tasks_to_wait:
+            await asyncio.wait(tasks_to_wait, timeout=10)
+        if self.monitor is not None:
+            await self.monitor.flush()
+        if self.session and not self.session.closed:
+            await self.session.close()
+        await super().close()
+    
     async def on_ready(self):
         """机器人就绪事件处理"""
         logger.info(f"机器人已登录: {self.user.name}")
         
-        # 启动监控任务
-        self.monitor_task = self.loop.create_task(self.monitor_products())
-        logger.info("商品监控任务已启动")
+        # 解析并缓存通知频道，发送通知时无需每次查找
+        await self._resolve_channels()
+        
+        # 定期保存任务异常退出后，在重连时重新启动
+        if not self.flush_state.is_running():
+            self.flush_state.start()
+            logger.info("状态保存任务已重新启动")
+        
+        # 启动监控任务（重连时 on_ready 会再次触发，已在运行则不重复启动）
+        if not self.monitor_products.is_running():
+            self.monitor_products.start()
+            logger.info("商品监控任务已启动")
+        else:
+            logger.info("商品监控任务已在运行，跳过启动")
     
+    @tasks.loop(seconds=30)
     async def monitor_products(self):
-        """监控商品状态变化并发送通知"""
-        while True:
-            try:
-                notifications = await self.monitor.check_all_items()
-                
-                for notification in notifications:
-                    # 生成通知消息
-                    status_messages = {
-                        ProductStatus.IN_STOCK: f"🟢 商品已上架！{f'价格: {notification.price}' if notification.price else ''}",
-                        ProductStatus.SOLD_OUT: "🔴 商品已售罄",
-                        ProductStatus.COMING_SOON: "🟡 商品即将发售",
-                        ProductStatus.OFF_SHELF: "⚫ 商品已下架",
-                        ProductStatus.UNKNOWN: "❓ 商品状态未知"
-                    }
-                    
-                    # 获取商品名称
-                    product_name = notification.url.split('/')[-1].replace('-', ' ')
-                    
-                    # 创建嵌入消息
-                    embed = discord.Embed(
-                        title=f"商品状态更新: {product_name}",
-                        description=status_messages.get(notification.new_status, "状态未知"),
-                        url=notification.url,
-                        color=discord.Color.green() if notification.new_status == ProductStatus.IN_STOCK else discord.Color.red()
-                    )
-                    
-                    # 添加状态变化信息
-                    embed.add_field(
-                        name="状态变化",
-                        value=f"{notification.old_status.value} → {notification.new_status.value}",
-                        inline=False
-                    )
-                    
-                    # 如果有价格，添加价格信息
-                    if notification.price:
-                        embed.add_field(name="价格", value=notification.price, inline=True)
-                    
-                    # 添加时间戳
-                    embed.timestamp = datetime.now()
-                    
-                    # 发送通知
-                    for channel_id in self.notification_channels:
-                        try:
-                            channel = self.get_channel(channel_id)
-                            if channel:
-                                await channel.send(embed=embed)
-                            else:
-                                logger.warning(f"找不到频道: {channel_id}")
-                        except Exception as e:
-                            logger.error(f"发送通知到频道 {channel_id} 时出错: {str(e)}")
-                
-            except Exception as e:
-                logger.error(f"监控任务出错: {str(e)}")
-                logger.error(traceback.format_exc())
-            
-            # 等待下一次检查
+        """监控商品状态变化并发送通知（每次执行一轮检查，间隔由配置决定）"""
+        notifications = await self.monitor.check_all_items()
+        
+        # 本轮的状态变化一次性写入，不必等待下一次定期保存
+        await self.monitor.flush()
+
+        # 同一轮的通知共用一个时间（发现时间交给 Discord 按用户所在时区渲染）
+        now = utcnow()
+        discovered_at = f"发现时间：<t:{int(now.timestamp())}:F>"
+        timestamp = now.isoformat()
+        
+        embeds = []
+        for notification in notifications:
+            # 生成通知消息（仅在上架且有价格时拼接价格）
+            status_message = self.STATUS_MESSAGES.get(notification.new_status, "状态未知")
+            if notification.new_status is ProductStatus.IN_STOCK and notification.price:
+                status_message = f"{status_message}价格: {notification.price}"
+
+            # 获取商品名称（优先使用添加时保存的名称，无需再解析 URL）
+            product_name = (notification.name or notification.url.rpartition('/')[2]).replace('-', ' ')
+
+            # 一次性构建嵌入消息（状态变化、价格、时间戳）
+            fields = [{
+                'name': FIELD_STATUS_CHANGE,
+                'value': f"{notification.old_status.value} → {notification.new_status.value}",
+                'inline': False
+            }]
+            if notification.price:
+                fields.append({'name': FIELD_PRICE, 'value': notification.price, 'inline': True})
+            embed = self._item_embed(
+                title=f"商品状态更新: {product_name}",
+                description=f"{status_message}\n{discovered_at}",
+                color=self._get_status_color(notification.new_status.value).value,
+                fields=fields,
+                url=notification.url,
+                icon_url=notification.icon_url,
+                timestamp=timestamp
+            )
+            embeds.append(embed)
+        
+        # 每个频道按顺序发送本轮的全部通知，不同频道之间并发
+        if embeds:
+            await self._broadcast(embeds)
+        
+        # 本轮成功完成，重置退避时间
+        self._monitor_backoff = self.MONITOR_BACKOFF_BASE
+    
+    @monitor_products.before_loop
+    async def before_monitor_products(self):
+        """等待机器人就绪后再开始检查（退避重启可能发生在断线期间）"""
+        await self.wait_until_ready()
+    
+    @monitor_products.error
+    async def on_monitor_error(self, error: BaseException):
+        """监控任务异常退出时按带随机抖动的指数退避重启"""
+        logger.error("监控任务出错", exc_info=error)
+        
+        # 加入最多 25% 的随机抖动，避免每次都在同一相位重试
+        delay = self._monitor_backoff + random.uniform(0, self._monitor_backoff * 0.25)
+        self._monitor_backoff = min(self._monitor_backoff * 2, self.MONITOR_BACKOFF_MAX)
+        logger.info("%.1f 秒后重启监控任务", delay)
+        asyncio.get_running_loop().call_later(delay, self._restart_monitor)
+    
+    def _restart_monitor(self):
+        """重启监控任务"""
+        if not self.is_closed() and not self.monitor_products.is_running():
+            self.monitor_products.start()
+    
+    def _send_bucket(self, channel_id: int) -> TokenBucket:
+        """获取频道对应的令牌桶"""
+        bucket = self._send_buckets.get(channel_id)
+        if bucket is None:
+            bucket = self._send_buckets[channel_id] = TokenBucket(rate=5, per=5.0)
+        return bucket
+    
+    async def _resolve_channels(self):
+        """解析通知频道并写入缓存，本地缓存未命中时通过 API 获取"""
+        for channel_id in self.notification_channels:
+            if channel_id in self._channel_cache:
+                continue
+            channel = self.get_channel(channel_id)
+            if channel is None:
+                try:
+                    channel = await self.fetch_channel(channel_id)
+                except discord.HTTPException as e:
+                    logger.error(f"获取通知频道 {channel_id} 失败: {str(e)}")
+                    continue
+            self._channel_cache[channel_id] = channel
+    
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
+        """通知频道被删除时移出缓存"""
+        if self._channel_cache.pop(channel.id, None) is not None:
+            logger.warning(f"通知频道已被删除: {channel.id}")
+    
+    async def on_guild_channel_update(self, before: discord.abc.GuildChannel, after: discord.abc.GuildChannel):
+        """通知频道更新时刷新缓存中的对象"""
+        if after.id in self._channel_cache:
+            self._channel_cache[after.id] = after
+    
+    async def _send_to_channel(self, channel: discord.abc.Messageable, embeds: List[discord.Embed]):
+        """按频道限流依次发送嵌入消息，单条失败不影响后续消息"""
+        bucket = self._send_bucket(channel.id)
+        for embed in embeds:
             try:
-                await asyncio.sleep(self.check_interval)
-            except asyncio.CancelledError:
-                logger.info("监控任务被取消")
-                break
+                async with bucket:
+                    await channel.send(embed=embed)
             except Exception as e:
-                logger.error(f"等待间隔时出错: {str(e)}")
-                await asyncio.sleep(60)  # 发生错误时使用较长的等待时间
+                logger.error("发送通知到频道 %s 时出错: %s", channel.id, e)
+    
+    async def _broadcast(self, embeds: List[discord.Embed]):
+        """并发发送嵌入消息到所有已缓存的通知频道（同一频道内保持顺序）"""
+        if not self._channel_cache:
+            logger.warning("没有可用的通知频道: %s", self.notification_channels)
+            return
+        await asyncio.gather(*(
+            self._send_to_channel(channel, embeds)
+            for channel in tuple(self._channel_cache.values())
+        ))
     
     async def send_notification(self, embed: discord.Embed):
-        """发送通知消息到指定频道"""
-        try:
-            channel = self.get_channel(self.config.discord.channel_id)
-            if channel:
-                await channel.send(embed=embed)
-            else:
-                logger.error(f"无法找到通知频道: {self.config.discord.channel_id}")
-        except Exception as e:
-            logger.error(f"发送通知消息时出错: {str(e)}")
+        """发送通知消息到所有通知频道"""
+        if not self._channel_cache:
+            await self._resolve_channels()
+        await self._broadcast([embed])
     
     async def on_error(self, event, *args, **kwargs):
         """错误处理"""
@@ -344,48 +663,38 @@ class DiscordBot(discord.Client):
         logger.error(f"命令执行出错: {str(error)}")
         await ctx.send(f"命令执行出错: {str(error)}")
 
-    async def check_and_notify(self):
-        """检查商品状态并发送通知"""
-        try:
-            notifications = await self.monitor.check_all_items()
-            
-            if notifications:
-                channel = self.get_channel(self.config.discord.channel_id)
-                if channel:
-                    for notification in notifications:
-                        embed = discord.Embed(
-                            title=notification['name'],
-                            url=notification['url'],
-                            description=notification['message'],
-                            color=self._get_status_color(notification['status'])
-                        )
-                        
-                        if notification.get('price'):
-                            embed.add_field(name="价格", value=notification['price'], inline=True)
-                            
-                        await channel.send(embed=embed)
-                else:
-                    logger.error(f"找不到通知频道: {self.config.discord.channel_id}")
-                    
-        except Exception as e:
-            logger.error(f"检查商品状态时出错: {str(e)}")
-            
     def _get_status_color(self, status: str) -> discord.Color:
         """获取状态对应的颜色"""
-        status_colors = {
-            'in_stock': discord.Color.green(),
-            'sold_out': discord.Color.red(),
-            'coming_soon': discord.Color.gold(),
-            'off_shelf': discord.Color.dark_gray(),
-            'unknown': discord.Color.light_gray()
-        }
-        return status_colors.get(status, discord.Color.default())
+        return self.STATUS_COLORS.get(status, discord.Color.default())
 
 async def run_bot(config: Config):
     """运行 Discord 机器人"""
     try:
-        bot = DiscordBot(config)
-        await bot.start(config.discord.token)
+        loop = asyncio.get_running_loop()
+        logger.info(f"事件循环: {type(loop).__module__}.{type(loop).__name__}")
+
+        # Python 3.12+ 使用 eager task factory，协程在首次挂起前同步执行，省去一次调度
+        eager_task_factory = getattr(asyncio, 'eager_task_factory', None)
+        if eager_task_factory is not None:
+            loop.set_task_factory(eager_task_factory)
+
+        # 以异步上下文管理器运行，任何异常退出时都会执行 close()，释放共享 HTTP 会话
+        async with DiscordBot(config) as bot:
+            # 收到 SIGTERM/SIGINT 时走正常的关闭流程（Windows 不支持，跳过）
+            shutdown_tasks = set()
+
+            def request_shutdown():
+                task = loop.create_task(bot.close())
+                shutdown_tasks.add(task)
+                task.add_done_callback(shutdown_tasks.discard)
+
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                try:
+                    loop.add_signal_handler(sig, request_shutdown)
+                except (NotImplementedError, RuntimeError):
+                    pass
+
+            await bot.start(config.discord.token)
     except Exception as e:
         logger.error(f"运行机器人时出错: {str(e)}")
         raise
\ No newline at end of file
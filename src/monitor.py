@@ -2,15 +2,14 @@
 监控模块，负责检查商品可用性
 """
 import os
-import logging
 import asyncio
+import functools
 from typing import Optional, Dict, List, Tuple
 import aiohttp
-from bs4 import BeautifulSoup
-from src.config import config
+from bs4 import BeautifulSoup, Comment, SoupStrainer, Tag
 import json
 import re
-from urllib.parse import quote, urlparse, urlunparse
+from urllib.parse import quote, urlparse, urlunparse, urlsplit, urlunsplit, parse_qsl, urlencode
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
@@ -27,12 +26,87 @@ from pathlib import Path
 import socket
 import dns.resolver
 from enum import Enum
+from types import MappingProxyType
+from html import unescape
 from datetime import datetime
-import traceback
 from dataclasses import dataclass
 import psutil
 
-logger = logging.getLogger(__name__)
+from src import _json
+from src._log import logger
+
+# 优先使用基于 libxml2 的 lxml 解析器，未安装时回退到标准库解析器
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+# 安装了 brotli 解码库时才声明接受 br 压缩，否则 aiohttp 无法解压响应
+try:
+    import brotli  # noqa: F401
+    ACCEPT_ENCODING = 'gzip, deflate, br'
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        ACCEPT_ENCODING = 'gzip, deflate, br'
+    except ImportError:
+        ACCEPT_ENCODING = 'gzip, deflate'
+
+# 请求商品页面时使用的固定请求头，作为共享会话的默认请求头
+REQUEST_HEADERS = MappingProxyType({
+    'User-Agent': (
+        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+        '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+    ),
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Accept-Encoding': ACCEPT_ENCODING,
+})
+
+# HTTP 预检查最多读取的页面字节数
+# __NEXT_DATA__ 位于文档末尾，上限需覆盖完整的商品页面
+MAX_PRECHECK_BYTES = 2 * 1024 * 1024
+
+# POPMART 商品详情 JSON 接口（按 spuId 查询，直接返回各规格库存）
+PRODUCT_API_URL = 'https://prod-global-api.popmart.com/shop/v1/shop/productDetails'
+API_HEADERS = MappingProxyType({'Accept': 'application/json'})
+
+# Next.js 页面内嵌的初始数据
+NEXT_DATA_RE = re.compile(rb'<script id="__NEXT_DATA__"[^>]*>(.*?)</script>', re.S)
+
+# 从商品 URL 中提取 ID 与最后一段路径
+PRODUCT_ID_RE = re.compile(r'/products/([^/]+)')
+LAST_SEGMENT_RE = re.compile(r'/([^/]+)$')
+
+# 商品页面不存在的标志（URL/标题与页面内容，均为小写）
+NOT_FOUND_URL_MARKERS = ("404", "error", "not found")
+NOT_FOUND_INDICATORS = (
+    "404",
+    "page not found",
+    "找不到页面",
+    "页面不存在",
+    "product is not available",
+    "product not found"
+)
+# 预编译为忽略大小写的单个正则，一次扫描即可判断，无需先生成整页的小写副本
+NOT_FOUND_URL_RE = re.compile('|'.join(map(re.escape, NOT_FOUND_URL_MARKERS)), re.I)
+NOT_FOUND_PAGE_RE = re.compile('|'.join(map(re.escape, NOT_FOUND_INDICATORS)), re.I)
+
+# POPMART 商品页的价格元素：class 含 price 且直接包含带 $ 的文本
+PRICE_TAG_RE = re.compile(r'<[a-zA-Z][^>]*?\sclass="[^"]*price[^"]*"[^>]*>([^<]*\$[^<]*)<')
+
+# 提取价格时只构建 <body> 的文档树，跳过 <head> 中的样式、脚本和元数据
+BODY_STRAINER = SoupStrainer('body')
+
+# 不会显示在页面上的标签，提取文本时跳过
+NON_VISIBLE_TAGS = frozenset({'script', 'style', 'noscript', 'template'})
+
+# 价格快速路径只在 <body> 中匹配，并先去掉注释和不可见标签，与文档树遍历跳过的内容一致
+BODY_START_RE = re.compile(r'<body[\s>]', re.I)
+HIDDEN_MARKUP_RE = re.compile(
+    r'<!--.*?-->|<(%s)\b.*?</\1\s*>' % '|'.join(sorted(NON_VISIBLE_TAGS)), re.S | re.I
+)
 
 class ProductStatus(Enum):
     """商品状态枚举"""
@@ -49,6 +123,8 @@ class Notification:
     old_status: ProductStatus   # 之前的状态
     new_status: ProductStatus   # 新状态
     price: Optional[str] = None # 价格（可选）
+    name: Optional[str] = None  # 商品名称（添加时保存的元数据）
+    icon_url: Optional[str] = None  # 商品图片（添加时保存的元数据）
 
 class Monitor:
     """
@@ -56,16 +132,29 @@ class Monitor:
     负责检查商品页面的可用性状态
     """
     
-    def __init__(self, config):
-        """初始化监控器"""
+    # 数据文件所在目录
+    data_dir = "data"
+    
+    def __init__(self, config, session: Optional[aiohttp.ClientSession] = None):
+        """初始化监控器（不读取数据文件，需要加载已保存的监控列表时使用 create()）"""
         self.config = config
+        self.session = session  # 由机器人注入的共享 HTTP 会话
         self.monitored_items = {}
         self.unknown_count = {}
         self._cleanup_counter = 0
         self._max_cleanup_interval = 10  # 每10次检查进行一次清理
-        self.data_dir = "data"
+        self._dirty = False  # 是否有未保存的状态变化
+        self.version = 0  # 监控列表版本号，增删商品或状态变化时递增
+        self._save_lock = asyncio.Lock()
+        self._validators: Dict[str, Dict[str, str]] = {}  # 待保存的 ETag/Last-Modified
         self.data_file = os.path.join(self.data_dir, "monitored_items.json")
-        self._load_monitored_items()
+    
+    @classmethod
+    async def create(cls, config, session: Optional[aiohttp.ClientSession] = None) -> 'Monitor':
+        """创建监控器并在后台线程中加载已保存的监控列表"""
+        monitor = cls(config, session=session)
+        await asyncio.to_thread(monitor._load_monitored_items)
+        return monitor
     
    # 可购买状态的关键词
     AVAILABLE_KEYWORDS = [
@@ -88,6 +177,21 @@ class Monitor:
         'notify me'
     ]
     
+    # 规范化 URL 时保留的查询参数（区分商品规格）
+    KEPT_QUERY_PARAMS = frozenset({'spu_id', 'sku_id'})
+    
+    # 预编译为忽略大小写的正则，一次扫描即可匹配全部关键词
+    AVAILABLE_RE = re.compile('|'.join(map(re.escape, AVAILABLE_KEYWORDS)), re.I)
+    SOLD_OUT_RE = re.compile('|'.join(map(re.escape, SOLD_OUT_KEYWORDS)), re.I)
+    
+    # 渲染后页面的按钮文本检查区分大小写：页面源码中的 JSON、多语言文案等
+    # 可能以其他大小写包含相同短语，只按按钮上显示的原样文本匹配
+    AVAILABLE_BUTTON_RE = re.compile('|'.join(map(re.escape, AVAILABLE_KEYWORDS)))
+    SOLD_OUT_BUTTON_RE = re.compile('|'.join(map(re.escape, SOLD_OUT_KEYWORDS)))
+    
+    # 合法的已保存状态值
+    STATUS_VALUES = frozenset(status.value for status in ProductStatus)
+    
     # 临时目录列表
     _temp_dirs = []
     
@@ -108,36 +212,90 @@ class Monitor:
         
         if os.path.exists(self.data_file):
             try:
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    self.monitored_items = json.load(f)
-                # 兼容旧数据：将字符串状态转换为枚举
+                with open(self.data_file, 'rb') as f:
+                    raw_items = _json.loads(f.read())
+                # 规范化 URL 并合并重复的商品，有变化时重写一次数据文件
+                self.monitored_items = {}
+                for url, item in raw_items.items():
+                    self.monitored_items.setdefault(self.normalize_url(url), item)
+                if list(self.monitored_items) != list(raw_items):
+                    logger.info(f"规范化监控列表 URL: {len(raw_items)} -> {len(self.monitored_items)} 个商品")
+                    self._dirty = True
+                # 兼容旧数据：无法识别的状态重置为 unknown，合法的已保存状态保持不变
                 for url, item in self.monitored_items.items():
-                    if isinstance(item.get('last_status'), str) or item.get('last_status') is None:
+                    if item.get('last_status') not in Monitor.STATUS_VALUES:
                         item['last_status'] = ProductStatus.UNKNOWN.value
+                    # 兼容旧数据：补充商品 ID，之后直接读取无需再解析 URL
+                    if not item.get('id'):
+                        try:
+                            item['id'] = self.parse_product_info(url)['id']
+                        except ValueError:
+                            item['id'] = item.get('name', url)
             except Exception as e:
                 logger.error(f"加载监控列表失败: {str(e)}")
                 self.monitored_items = {}
 
-    def _save_monitored_items(self):
-        """保存监控列表到文件"""
+    def _save_monitored_items(self, items: Optional[Dict[str, dict]] = None):
+        """保存监控列表到文件（先写临时文件再原子替换，避免写到一半时文件损坏）"""
+        tmp_file = f"{self.data_file}.tmp"
         try:
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(self.monitored_items, f, ensure_ascii=False, indent=2)
+            with open(tmp_file, 'wb') as f:
+                f.write(_json.dumps(self.monitored_items if items is None else items))
+            os.replace(tmp_file, self.data_file)
         except Exception as e:
             logger.error(f"保存监控列表失败: {str(e)}")
 
+    async def save(self):
+        """在后台线程中保存监控列表"""
+        # 串行化写入，避免多个线程同时写同一个临时文件
+        async with self._save_lock:
+            self._dirty = False
+            # 在事件循环线程中做快照，避免写文件时字典被并发修改
+            snapshot = {url: dict(item) for url, item in self.monitored_items.items()}
+            await asyncio.to_thread(self._save_monitored_items, snapshot)
+
+    def mark_dirty(self):
+        """标记监控列表有未保存的修改，由 flush() 统一写入"""
+        self._dirty = True
+
+    async def flush(self):
+        """如有未保存的修改，在后台线程中写入文件"""
+        if self._dirty:
+            await self.save()
+
+    @staticmethod
+    @functools.lru_cache(maxsize=2048)
+    def normalize_url(url: str) -> str:
+        """
+        规范化商品 URL，作为监控列表的键
+        域名转小写，去掉片段、末尾斜杠和无关的查询参数
+        """
+        parts = urlsplit(url.strip())
+        query = urlencode(sorted(
+            (key, value) for key, value in parse_qsl(parts.query)
+            if key in Monitor.KEPT_QUERY_PARAMS
+        ))
+        return urlunsplit((
+            parts.scheme.lower(),
+            parts.netloc.lower(),
+            parts.path.rstrip('/') or '/',
+            query,
+            ''
+        ))
+
     @staticmethod
+    @functools.lru_cache(maxsize=4096)
     def parse_product_info(url: str) -> Dict[str, str]:
-        """从 URL 解析商品信息"""
+        """从 URL 解析商品信息（结果按 URL 缓存，调用方不应修改返回的字典）"""
         # 匹配商品 ID
-        match = re.search(r'/products/([^/]+)', url)
+        match = PRODUCT_ID_RE.search(url)
         if not match:
             raise ValueError("无效的商品 URL")
         
         product_id = match.group(1)
         
         # 从 URL 中提取商品名称（如果有）
-        name_match = re.search(r'/([^/]+)$', url)
+        name_match = LAST_SEGMENT_RE.search(url)
         name = name_match.group(1) if name_match else product_id
         
         return {
@@ -145,19 +303,21 @@ class Monitor:
             'name': name
         }
 
-    async def add_monitored_item(self, url: str, name: str, icon_url: str = None) -> bool:
+    async def add_monitored_item(self, url: str, name: str, icon_url: str = None, product_id: str = None) -> bool:
         """添加商品到监控列表"""
         if url in self.monitored_items:
             return False
         
         self.monitored_items[url] = {
+            'id': product_id or name,
             'name': name,
             'last_status': ProductStatus.UNKNOWN.value,
             'last_check': None,
             'last_notification': None,
             'icon_url': icon_url
         }
-        self._save_monitored_items()
+        self.version += 1
+        self.mark_dirty()
         return True
 
     async def remove_monitored_item(self, url: str) -> bool:
@@ -166,9 +326,29 @@ class Monitor:
             return False
         
         del self.monitored_items[url]
-        self._save_monitored_items()
+        self.version += 1
+        self.mark_dirty()
         return True
 
+    @staticmethod
+    def make_session() -> aiohttp.ClientSession:
+        """
+        创建商品请求使用的 HTTP 会话
+        应在启动时创建一次并在所有监控周期中复用，连接保持存活、DNS 结果缓存
+        """
+        connector = aiohttp.TCPConnector(
+            limit=32,
+            limit_per_host=8,
+            ttl_dns_cache=300,
+            keepalive_timeout=75,
+            enable_cleanup_closed=True
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            headers=REQUEST_HEADERS,
+            timeout=aiohttp.ClientTimeout(total=15, connect=5)
+        )
+
     @staticmethod
     def create_driver() -> Optional[webdriver.Chrome]:
         """创建Chrome WebDriver实例"""
@@ -311,8 +491,8 @@ class Monitor:
             return False
 
     @staticmethod
-    async def check_network(url):
-        """检查网络连接"""
+    async def check_network(url, session: Optional[aiohttp.ClientSession] = None):
+        """检查网络连接，提供 session 时复用其连接池代替 curl 子进程"""
         try:
             # 检查 DNS 解析
             resolved_domain = Monitor.check_dns(url)
@@ -336,6 +516,16 @@ class Monitor:
             except Exception as e:
                 logger.warning(f"Ping 执行失败: {str(e)}")
             
+            # 如果 ping 失败，优先通过共享会话发起 HEAD 请求
+            if session is not None:
+                try:
+                    async with session.head(new_url, allow_redirects=True) as response:
+                        logger.info(f"HEAD {new_url} 成功: {response.status}")
+                        return True, new_url
+                except Exception as e:
+                    logger.warning(f"HEAD {new_url} 失败: {str(e)}")
+                return False, new_url
+            
             # 如果 ping 失败，尝试 curl
             try:
                 result = subprocess.run(['curl', '-I', '-s', '-m', '10', new_url], 
@@ -376,17 +566,15 @@ class Monitor:
                 )
                 
                 # 获取页面内容
-                page_content = driver.page_source.lower()
+                page_content = driver.page_source
                 
                 # 检查是否可购买
-                for keyword in Monitor.AVAILABLE_KEYWORDS:
-                    if keyword.lower() in page_content:
-                        return True
+                if Monitor.AVAILABLE_RE.search(page_content):
+                    return True
                 
                 # 检查是否售罄
-                for keyword in Monitor.SOLD_OUT_KEYWORDS:
-                    if keyword.lower() in page_content:
-                        return False
+                if Monitor.SOLD_OUT_RE.search(page_content):
+                    return False
                 
                 # 如果没有找到任何关键词，返回 None
                 return None
@@ -407,16 +595,226 @@ class Monitor:
             logger.error(f"检查商品可用性时出错: {str(e)}")
             return None
 
+    @staticmethod
+    def status_from_next_data(body: bytes) -> Optional[Tuple[ProductStatus, Optional[str]]]:
+        """
+        从页面内嵌的 __NEXT_DATA__ JSON 中读取商品库存状态，返回 (状态, 价格)
+        有货且数据中带有价格文本时一并返回，找不到数据或没有可识别的库存字段时返回 None
+        """
+        match = NEXT_DATA_RE.search(body)
+        if not match:
+            return None
+        try:
+            data = _json.loads(match.group(1))
+        except ValueError:
+            return None
+        if not isinstance(data, dict):
+            return None
+        
+        page_props = (data.get('props') or {}).get('pageProps') or {}
+        product = page_props.get('product') or page_props.get('productDetail')
+        if not isinstance(product, dict):
+            return None
+        
+        status = Monitor._product_stock_status(product)
+        if status is None:
+            return None
+        
+        # 只使用已格式化的价格文本，数字价格的单位和币种无法确定，交由调用方从页面提取
+        price = product.get('price') if status == ProductStatus.IN_STOCK else None
+        return status, price.strip() if isinstance(price, str) and price.strip() else None
+
+    @staticmethod
+    def _product_stock_status(product: dict) -> Optional[ProductStatus]:
+        """从 __NEXT_DATA__ 的商品对象中读取库存状态，没有可识别的库存字段时返回 None"""
+        for key in ('soldOut', 'isSoldOut'):
+            if isinstance(product.get(key), bool):
+                return ProductStatus.SOLD_OUT if product[key] else ProductStatus.IN_STOCK
+        for key in ('available', 'inStock', 'isAvailable'):
+            if isinstance(product.get(key), bool):
+                return ProductStatus.IN_STOCK if product[key] else ProductStatus.SOLD_OUT
+        stock = product.get('stock')
+        if isinstance(stock, (int, float)) and not isinstance(stock, bool):
+            return ProductStatus.IN_STOCK if stock > 0 else ProductStatus.SOLD_OUT
+        return None
+
+    @staticmethod
+    def status_from_api(data) -> Optional[Tuple[ProductStatus, Optional[str]]]:
+        """
+        从商品详情接口的响应中读取库存状态（data.skus[].stock），返回 (状态, 价格)
+        任一规格有库存即为有货，价格取该规格已格式化的价格文本（data.skus[].price）
+        没有数字库存字段时返回 None
+        """
+        skus = (data.get('data') or {}).get('skus') if isinstance(data, dict) else None
+        if not isinstance(skus, list):
+            return None
+        
+        found = False
+        for sku in skus:
+            stock = sku.get('stock') if isinstance(sku, dict) else None
+            if not isinstance(stock, (int, float)) or isinstance(stock, bool):
+                continue
+            if stock > 0:
+                # 数字价格的单位和币种无法确定，只使用价格文本，否则交由调用方从页面提取
+                price = sku.get('price')
+                return ProductStatus.IN_STOCK, price.strip() if isinstance(price, str) and price.strip() else None
+            found = True
+        return (ProductStatus.SOLD_OUT, None) if found else None
+
+    async def _api_check(self, url: str) -> Optional[Tuple[ProductStatus, Optional[str]]]:
+        """
+        通过商品详情 JSON 接口检查库存，只需几 KB 数据，返回 (状态, 价格)
+        接口不可用或无法识别时返回 None，交由页面检查
+        """
+        if self.session is None or self.session.closed:
+            return None
+        match = PRODUCT_ID_RE.search(url)
+        if not match:
+            return None
+        
+        try:
+            async with self.session.get(
+                PRODUCT_API_URL, params={'spuId': match.group(1)}, headers=API_HEADERS
+            ) as response:
+                if response.status != 200:
+                    return None
+                return self.status_from_api(_json.loads(await response.read()))
+        except Exception as e:
+            logger.warning(f"商品接口检查失败 ({url}): {str(e)}")
+        return None
+
+    @staticmethod
+    def extract_price(html: str) -> Optional[str]:
+        """从页面 HTML 中提取价格（class 含 price 或直接包含 $ 文本的第一个元素）"""
+        # 快速路径：在去掉注释和不可见标签的 <body> 中匹配 POPMART 的价格元素，无需构建文档树
+        body_start = BODY_START_RE.search(html)
+        if body_start:
+            match = PRICE_TAG_RE.search(HIDDEN_MARKUP_RE.sub('', html[body_start.start():]))
+            if match:
+                text = unescape(match.group(1)).strip()
+                if '$' in text:
+                    return text
+        
+        # 通用路径：解析页面并按文档顺序查找
+        soup = BeautifulSoup(html, HTML_PARSER, parse_only=BODY_STRAINER)
+        # 按文档顺序单次遍历：遇到 class 含 price 的元素，或直接包含 $ 的文本节点时检查其所在元素
+        for node in soup.descendants:
+            if isinstance(node, Tag):
+                if node.name in NON_VISIBLE_TAGS or not any('price' in cls for cls in node.get('class') or ()):
+                    continue
+                element = node
+            elif isinstance(node, Comment) or '$' not in node or node.parent.name in NON_VISIBLE_TAGS:
+                continue
+            else:
+                element = node.parent
+            text = element.get_text(' ', strip=True)
+            if '$' in text:
+                return text
+        return None
+
+    @staticmethod
+    async def _read_page(response: aiohttp.ClientResponse) -> bytes:
+        """分块读取页面，最多读取 MAX_PRECHECK_BYTES 字节，避免异常页面拖慢解析"""
+        chunks = []
+        size = 0
+        async for chunk in response.content.iter_chunked(64 * 1024):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= MAX_PRECHECK_BYTES:
+                break
+        return b''.join(chunks)
+
+    async def _fetch_page_price(self, url: str) -> Optional[str]:
+        """下载商品页面并在后台线程中提取价格，失败时返回 None（只在需要发送有货通知时调用）"""
+        if self.session is None or self.session.closed:
+            return None
+        try:
+            async with self.session.get(url, allow_redirects=True) as response:
+                if response.status != 200 or 'html' not in response.content_type:
+                    return None
+                body = await self._read_page(response)
+                return await asyncio.to_thread(
+                    Monitor.extract_price, body.decode(response.charset or 'utf-8', 'replace')
+                )
+        except Exception as e:
+            logger.warning(f"获取商品价格失败 ({url}): {str(e)}")
+        return None
+
+    async def _precheck(self, url: str) -> Optional[Tuple[ProductStatus, Optional[str]]]:
+        """
+        不启动浏览器的轻量检查：先查商品详情接口，接口无法确定时再查页面 __NEXT_DATA__
+        能确定状态时返回 (状态, 价格)，否则返回 None，交由浏览器渲染检查
+        价格只取数据中已有的价格文本，缺少时由 check_all_items 在发送有货通知前再获取
+        """
+        api_result = await self._api_check(url)
+        if api_result is None:
+            return await self._http_precheck(url)
+        return api_result
+
+    async def _http_precheck(self, url: str) -> Optional[Tuple[ProductStatus, Optional[str]]]:
+        """
+        通过共享 HTTP 会话预检查商品页面
+        能直接确定状态时返回 (状态, 价格)，否则返回 None，交由浏览器渲染检查
+        """
+        if self.session is None or self.session.closed:
+            return None
+        
+        # 已有确定状态时发送条件请求，页面未变化时无需重新下载
+        # 库存由浏览器端渲染，页面未变化并不代表库存未变化，
+        # 因此 304 时只沿用上次从 __NEXT_DATA__ 读到的状态，读不到时仍交由浏览器检查
+        item = self.monitored_items.get(url) or {}
+        cached_status = item.get('last_status')
+        headers = {}
+        if cached_status and cached_status != ProductStatus.UNKNOWN.value:
+            if item.get('etag'):
+                headers['If-None-Match'] = item['etag']
+            if item.get('last_modified'):
+                headers['If-Modified-Since'] = item['last_modified']
+        
+        try:
+            # 固定请求头由会话统一携带，这里只传入条件请求头
+            async with self.session.get(url, headers=headers or None, allow_redirects=True) as response:
+                if response.status == 304 and headers:
+                    page_status = item.get('page_status')
+                    return (ProductStatus(page_status), item.get('page_price')) if page_status else None
+                if response.status in (404, 410):
+                    return ProductStatus.OFF_SHELF, None
+                
+                # 非 HTML 响应（JSON 错误、验证页等）不读取也不解析，交由浏览器检查
+                if response.status != 200 or 'html' not in response.content_type:
+                    return None
+                
+                # 页面内嵌的 __NEXT_DATA__ 中带有库存信息时直接得出状态，无需启动浏览器
+                body = await self._read_page(response)
+                page_status, page_price = self.status_from_next_data(body) or (None, None)
+                
+                # 记录缓存校验信息，待本次检查得到确定状态后再写入商品数据
+                # 同时记录从页面数据得出的状态，304 时只信任该状态
+                validators = {
+                    key: value for key, value in (
+                        ('etag', response.headers.get('ETag')),
+                        ('last_modified', response.headers.get('Last-Modified'))
+                    ) if value
+                }
+                if validators:
+                    validators['page_status'] = page_status.value if page_status else None
+                    validators['page_price'] = page_price
+                    self._validators[url] = validators
+                return (page_status, page_price) if page_status else None
+        except Exception as e:
+            logger.warning(f"HTTP 预检查失败 ({url}): {str(e)}")
+        return None
+
     async def check_item_status(self, url: str) -> Tuple[ProductStatus, Optional[str]]:
-        """检查商品状态"""
+        """通过浏览器渲染检查商品状态（轻量检查由调用方通过 _precheck() 完成）"""
         driver = None
         max_retries = 2  # 最大重试次数
         retry_count = 0
         
         while retry_count <= max_retries:
             try:
-                # 创建 Chrome WebDriver
-                driver = Monitor.create_driver()
+                # 创建 Chrome WebDriver（在线程中执行，避免阻塞事件循环）
+                driver = await asyncio.to_thread(Monitor.create_driver)
                 if not driver:
                     logger.error("无法创建 WebDriver")
                     return ProductStatus.UNKNOWN, None
@@ -427,7 +825,7 @@ class Monitor:
                     driver.set_script_timeout(5)      # 减少脚本超时
                     
                     # 访问商品页面
-                    driver.get(url)
+                    await asyncio.to_thread(driver.get, url)
                     
                     # 使用更短的等待时间和更快的检查方式
                     try:
@@ -467,7 +865,6 @@ class Monitor:
                         html = driver.page_source
                         if not html:
                             raise ValueError("页面内容为空")
-                        html_lower = html.lower()
                     except Exception as e:
                         logger.error(f"获取页面内容时出错: {str(e)}")
                         if retry_count < max_retries:
@@ -475,27 +872,14 @@ class Monitor:
                             continue
                         return ProductStatus.UNKNOWN, None
                     
-                    # 检查是否是404页面
-                    not_found_indicators = [
-                        "404",
-                        "page not found",
-                        "找不到页面",
-                        "页面不存在",
-                        "product is not available",
-                        "product not found"
-                    ]
-                    
                     # 快速检查404状态
                     try:
                         # 1. 检查URL和标题
-                        current_url = driver.current_url.lower()
-                        title = driver.title.lower()
-                        
-                        if any(x in current_url or x in title for x in ["404", "error", "not found"]):
+                        if NOT_FOUND_URL_RE.search(driver.current_url) or NOT_FOUND_URL_RE.search(driver.title):
                             return ProductStatus.OFF_SHELF, None
                         
                         # 2. 检查页面内容
-                        if any(x in html_lower for x in not_found_indicators):
+                        if NOT_FOUND_PAGE_RE.search(html):
                             return ProductStatus.OFF_SHELF, None
                         
                     except Exception as e:
@@ -504,20 +888,15 @@ class Monitor:
                     # 快速检查商品状态
                     try:
                         # 售罄状态
-                        if "NOTIFY ME WHEN AVAILABLE" in html:
+                        if Monitor.SOLD_OUT_BUTTON_RE.search(html):
                             return ProductStatus.SOLD_OUT, None
                         
                         # 可购买状态
-                        buy_keywords = ['ADD TO BAG', 'add to bag', 'add to my bag', 'ADD TO MY BAG', 'BUY NOW']
-                        if any(keyword in html for keyword in buy_keywords):
-                            # 快速提取价格
+                        if Monitor.AVAILABLE_BUTTON_RE.search(html):
+                            # 从已获取的页面内容中提取价格（本地解析，无需逐个元素请求 WebDriver）
                             price = None
                             try:
-                                price_elements = driver.find_elements(By.XPATH, "//*[contains(@class, 'price') or contains(text(), '$')]")
-                                for elem in price_elements:
-                                    if '$' in elem.text:
-                                        price = elem.text.strip()
-                                        break
+                                price = await asyncio.to_thread(Monitor.extract_price, html)
                             except Exception as e:
                                 logger.warning(f"提取价格时出错: {str(e)}")
                             return ProductStatus.IN_STOCK, price
@@ -593,6 +972,56 @@ class Monitor:
         except Exception as e:
             logger.error(f"清理资源时出错: {str(e)}")
             
+    async def _check_one(self, url: str, semaphore: asyncio.Semaphore,
+                         http_semaphore: asyncio.Semaphore) -> Optional[Tuple[str, ProductStatus, Optional[str]]]:
+        """检查单个商品，出错时返回 None"""
+        # 轻量检查使用单独的信号量，不占用浏览器名额，但同样在请求之间保持间隔
+        async with http_semaphore:
+            try:
+                precheck_result = await self._precheck(url)
+            finally:
+                await asyncio.sleep(self.config.monitor.request_delay)
+        if precheck_result is not None:
+            return (url, *precheck_result)
+
+        # 需要浏览器渲染时才受信号量限制（每个任务都会启动一个 Chrome 实例）
+        async with semaphore:
+            try:
+                current_status, price = await asyncio.wait_for(
+                    self.check_item_status(url), timeout=30
+                )
+                return url, current_status, price
+            except asyncio.TimeoutError:
+                logger.error("检查商品状态超时 (%s)", url)
+                return None
+            except Exception as e:
+                logger.error("检查商品状态时出错 (%s): %s", url, e)
+                return None
+            finally:
+                # 强制进行垃圾回收
+                import gc
+                gc.collect()
+                # 同一任务槽位的请求之间保持间隔，避免请求过快
+                await asyncio.sleep(self.config.monitor.request_delay)
+
+    async def check_many(self, urls) -> Dict[str, Tuple[ProductStatus, Optional[str]]]:
+        """
+        并发检查多个商品，返回 {url: (状态, 价格)}
+        同时进行的 HTTP 预检查和浏览器检查数量分别由 max_concurrency 限制，
+        每个槽位的请求之间间隔 request_delay 秒，检查失败的商品不在结果中
+        """
+        semaphore = asyncio.BoundedSemaphore(self.config.monitor.max_concurrency)
+        http_semaphore = asyncio.BoundedSemaphore(self.config.monitor.max_concurrency)
+        results = await asyncio.gather(
+            *(self._check_one(url, semaphore, http_semaphore) for url in urls),
+            return_exceptions=True
+        )
+        return {
+            result[0]: (result[1], result[2])
+            for result in results
+            if result is not None and not isinstance(result, BaseException)
+        }
+
     async def check_all_items(self) -> List[Notification]:
         """检查所有商品状态"""
         try:
@@ -603,83 +1032,67 @@ class Monitor:
                 self._cleanup_counter = 0
             
             notifications = []
-            items_to_check = list(self.monitored_items.items())
-            
-            # 创建信号量来限制并发数量
-            semaphore = asyncio.Semaphore(2)  # 减少到2个并发任务
+            dirty = False
+            # 对监控列表做快照，检查期间 /watch、/unwatch 修改字典不会影响迭代
+            results = await self.check_many(tuple(self.monitored_items))
             
-            # 分批处理商品
-            batch_size = 5  # 每批处理5个商品
-            for i in range(0, len(items_to_check), batch_size):
-                batch = items_to_check[i:i + batch_size]
+            for url, (current_status, price) in results.items():
+                item = self.monitored_items.get(url)
+                if item is None:
+                    # 检查期间商品已被移除
+                    continue
+                previous_status = ProductStatus(item.get('last_status') or ProductStatus.UNKNOWN.value)
+                # 只更新内存中的检查时间，随下一次保存一起写入，不单独触发写文件
+                item['last_check'] = datetime.now().isoformat()
                 
-                async def check_with_semaphore(url: str, previous_status: ProductStatus) -> Optional[Tuple[str, ProductStatus, Optional[str]]]:
-                    async with semaphore:
-                        try:
-                            current_status, price = await self.check_item_status(url)
-                            return url, current_status, price
-                        except Exception as e:
-                            logger.error(f"检查商品状态时出错 ({url}): {str(e)}")
-                            return None
-                        finally:
-                            # 强制进行垃圾回收
-                            import gc
-                            gc.collect()
+                # 只有得到确定状态时才保存缓存校验信息，保证 304 时沿用的状态与页面一致
+                validators = self._validators.pop(url, None)
+                if validators and current_status != ProductStatus.UNKNOWN:
+                    if any(item.get(key) != value for key, value in validators.items()):
+                        item.update(validators)
+                        dirty = True
                 
-                # 创建当前批次的任务
-                tasks = []
-                for url, previous_status in batch:
-                    task = asyncio.create_task(check_with_semaphore(url, previous_status))
-                    tasks.append(task)
+                # 记录检查结果
+                logger.info("商品状态检查 - %s (%s):", url.rpartition('/')[2], url)
+                logger.info("  当前状态: %s", current_status.name.lower())
+                logger.info("  之前状态: %s", previous_status.name.lower())
                 
-                # 等待当前批次完成，设置超时
-                try:
-                    results = await asyncio.wait_for(asyncio.gather(*tasks, return_exceptions=True), timeout=30)
+                # 如果状态发生变化，创建通知
+                if current_status != previous_status and current_status != ProductStatus.UNKNOWN:
+                    # 轻量检查只返回数据中已有的价格文本，缺少时仅在发送有货通知前下载页面提取
+                    if current_status == ProductStatus.IN_STOCK and price is None:
+                        price = await self._fetch_page_price(url)
+                    notification = Notification(
+                        url=url,
+                        old_status=previous_status,
+                        new_status=current_status,
+                        price=price,
+                        name=item.get('name'),
+                        icon_url=item.get('icon_url')
+                    )
+                    notifications.append(notification)
                     
-                    for result in results:
-                        if result is None or isinstance(result, Exception):
-                            continue
-                            
-                        url, current_status, price = result
-                        previous_status = self.monitored_items.get(url)
-                        
-                        # 记录检查结果
-                        logger.info(f"商品状态检查 - {url.split('/')[-1]} ({url}):")
-                        logger.info(f"  当前状态: {current_status.name.lower()}")
-                        logger.info(f"  之前状态: {previous_status.name.lower()}")
-                        
-                        # 如果状态发生变化，创建通知
-                        if current_status != previous_status and current_status != ProductStatus.UNKNOWN:
-                            notification = Notification(
-                                url=url,
-                                old_status=previous_status,
-                                new_status=current_status,
-                                price=price
-                            )
-                            notifications.append(notification)
-                            
-                            # 更新状态
-                            self.monitored_items[url] = current_status
-                            
-                        # 如果连续返回unknown状态，记录警告
-                        elif current_status == ProductStatus.UNKNOWN:
-                            if url in self.unknown_count:
-                                self.unknown_count[url] += 1
-                                if self.unknown_count[url] >= 3:  # 连续3次unknown
-                                    logger.warning(f"商品 {url} 连续 {self.unknown_count[url]} 次返回unknown状态")
-                            else:
-                                self.unknown_count[url] = 1
-                        else:
-                            # 重置unknown计数
-                            self.unknown_count.pop(url, None)
+                    # 更新状态，统一在本轮检查结束后保存
+                    item['last_status'] = current_status.value
+                    item['last_notification'] = datetime.now().isoformat()
+                    self.version += 1
+                    dirty = True
                     
-                except asyncio.TimeoutError:
-                    logger.error("检查商品状态超时")
-                except Exception as e:
-                    logger.error(f"检查商品状态时出错: {str(e)}")
-                
-                # 批次间等待一小段时间，让系统有机会释放资源
-                await asyncio.sleep(2)
+                # 如果连续返回unknown状态，记录警告
+                elif current_status == ProductStatus.UNKNOWN:
+                    if url in self.unknown_count:
+                        self.unknown_count[url] += 1
+                        if self.unknown_count[url] >= 3:  # 连续3次unknown
+                            logger.warning("商品 %s 连续 %d 次返回unknown状态", url, self.unknown_count[url])
+                    else:
+                        self.unknown_count[url] = 1
+                else:
+                    # 重置unknown计数
+                    self.unknown_count.pop(url, None)
+            
+            # 本轮有状态变化时标记待保存，由后台任务定期写入
+            if dirty:
+                self.mark_dirty()
             
             return notifications 
         except Exception as e:
@@ -2,12 +2,12 @@
 存储模块，负责管理监控项目的持久化
 """
 import json
-import logging
 import os
 from typing import List, Dict, Any
 from datetime import datetime
 
-logger = logging.getLogger(__name__)
+from src import _json
+from src._log import logger
 
 class MonitorStore:
     """
@@ -26,8 +26,8 @@ class MonitorStore:
         # 设置存储文件路径
         self.file_path = os.path.join(self.data_dir, 'monitored_items.json')
         
-        # 初始化存储列表
-        self.items: List[Dict[str, Any]] = []
+        # 按 ID 索引的监控项目，查找与删除均为 O(1)
+        self._items: Dict[str, Dict[str, Any]] = {}
         
         # 加载数据
         self.load_items()
@@ -39,12 +39,12 @@ class MonitorStore:
         """
         try:
             if os.path.exists(self.file_path) and os.path.getsize(self.file_path) > 0:
-                with open(self.file_path, 'r', encoding='utf-8') as f:
-                    self.items = json.load(f)
-                logger.info(f"已加载 {len(self.items)} 个监控项目")
+                with open(self.file_path, 'rb') as f:
+                    self._items = {item.get('id'): item for item in _json.loads(f.read())}
+                logger.info(f"已加载 {len(self._items)} 个监控项目")
             else:
                 logger.info("监控项目文件不存在或为空，初始化为空列表")
-                self.items = []
+                self._items = {}
                 self.save_items()  # 创建初始文件
         except json.JSONDecodeError as e:
             logger.error(f"监控项目文件格式错误: {str(e)}")
@@ -53,20 +53,25 @@ class MonitorStore:
             if os.path.exists(self.file_path):
                 backup_path = f"{self.file_path}.{datetime.now().strftime('%Y%m%d_%H%M%S')}.bak"
                 os.rename(self.file_path, backup_path)
-            self.items = []
+            self._items = {}
             self.save_items()
         except Exception as e:
             logger.error(f"加载监控项目时出错: {str(e)}")
-            self.items = []
+            self._items = {}
+    
+    @property
+    def items(self) -> List[Dict[str, Any]]:
+        """监控项目列表（按添加顺序）"""
+        return list(self._items.values())
     
     def save_items(self) -> None:
         """
         保存监控项目列表到文件
         """
         try:
-            with open(self.file_path, 'w', encoding='utf-8') as f:
-                json.dump(self.items, f, ensure_ascii=False, indent=2)
-            logger.info(f"已保存 {len(self.items)} 个监控项目")
+            with open(self.file_path, 'wb') as f:
+                f.write(_json.dumps(self.items))
+            logger.info(f"已保存 {len(self._items)} 个监控项目")
         except Exception as e:
             logger.error(f"保存监控项目时出错: {str(e)}")
     
@@ -86,7 +91,7 @@ class MonitorStore:
                 return False
                 
             # 检查是否已存在
-            if any(x.get('id') == item['id'] for x in self.items):
+            if item['id'] in self._items:
                 logger.warning(f"监控项目已存在: {item['id']}")
                 return False
             
@@ -94,7 +99,7 @@ class MonitorStore:
             item['status'] = 'unknown'
             item['added_at'] = datetime.now().isoformat()
             
-            self.items.append(item)
+            self._items[item['id']] = item
             self.save_items()
             logger.info(f"已添加监控项目: {item['id']}")
             return True
@@ -113,10 +118,7 @@ class MonitorStore:
             bool: 是否移除成功
         """
         try:
-            original_length = len(self.items)
-            self.items = [x for x in self.items if x.get('id') != item_id]
-            
-            if len(self.items) < original_length:
+            if self._items.pop(item_id, None) is not None:
                 self.save_items()
                 logger.info(f"已移除监控项目: {item_id}")
                 return True
@@ -134,7 +136,7 @@ class MonitorStore:
         Returns:
             List[Dict[str, Any]]: 监控项目列表的副本
         """
-        return self.items.copy()  # 返回副本以防止外部修改
+        return self.items  # 每次生成新列表，外部修改不影响存储
         
     def get_item_by_id(self, item_id: str) -> Dict[str, Any]:
         """
@@ -146,7 +148,5 @@ class MonitorStore:
         Returns:
             Dict[str, Any]: 监控项目信息，如果不存在则返回空字典
         """
-        for item in self.items:
-            if item.get('id') == item_id:
-                return item.copy()  # 返回副本以防止外部修改
-        return {} 
\ No newline at end of file
+        item = self._items.get(item_id)
+        return item.copy() if item else {}  # 返回副本以防止外部修改 
\ No newline at end of file
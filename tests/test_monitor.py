@@ -0,0 +1,226 @@
+"""
+监控模块测试：页面 __NEXT_DATA__ 解析与 HTTP 预检查
+"""
+import asyncio
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from src import _json
+from src.monitor import Monitor, ProductStatus
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def read_fixture(name: str) -> bytes:
+    return (FIXTURES / name).read_bytes()
+
+
+def next_data_page(product: dict, key: str = 'product') -> bytes:
+    """生成只包含 __NEXT_DATA__ 的最小页面"""
+    data = _json.dumps({'props': {'pageProps': {key: product}}})
+    return b'<html><body><script id="__NEXT_DATA__" type="application/json">' + data + b'</script></body></html>'
+
+
+def test_next_data_in_stock_page():
+    # 数字价格不直接使用，交由调用方从页面提取
+    assert Monitor.status_from_next_data(read_fixture('product_page_in_stock.html')) == (ProductStatus.IN_STOCK, None)
+
+
+def test_next_data_sold_out_page():
+    assert Monitor.status_from_next_data(read_fixture('product_page_sold_out.html')) == (ProductStatus.SOLD_OUT, None)
+
+
+@pytest.mark.parametrize('key', ['product', 'productDetail'])
+@pytest.mark.parametrize('product, expected', [
+    ({'soldOut': True}, ProductStatus.SOLD_OUT),
+    ({'isSoldOut': False}, ProductStatus.IN_STOCK),
+    ({'available': True}, ProductStatus.IN_STOCK),
+    ({'inStock': False}, ProductStatus.SOLD_OUT),
+    ({'isAvailable': False}, ProductStatus.SOLD_OUT),
+    ({'stock': 3}, ProductStatus.IN_STOCK),
+    ({'stock': 0}, ProductStatus.SOLD_OUT),
+])
+def test_next_data_stock_fields(key, product, expected):
+    assert Monitor.status_from_next_data(next_data_page(product, key)) == (expected, None)
+
+
+def test_next_data_price_text():
+    body = next_data_page({'soldOut': False, 'price': ' $75.00 '})
+    assert Monitor.status_from_next_data(body) == (ProductStatus.IN_STOCK, '$75.00')
+
+
+@pytest.mark.parametrize('body', [
+    b'<html><body>no data</body></html>',
+    next_data_page({'title': 'no stock fields', 'stock': True}),
+    b'<script id="__NEXT_DATA__" type="application/json">{not json</script>',
+])
+def test_next_data_unknown(body):
+    assert Monitor.status_from_next_data(body) is None
+
+
+def test_extract_price_fast_path():
+    html = read_fixture('product_page_in_stock.html').decode('utf-8')
+    assert Monitor.extract_price(html) == '$75.00'
+
+
+@pytest.mark.parametrize('html', [
+    # <head>、注释和脚本中的价格元素都不应命中快速路径
+    '<html><head><title class="price">$9.99</title></head><body><div class="price"><span>$</span>75.00</div></body></html>',
+    '<html><body><!-- <span class="price">$1.00</span> --><div class="price"><span>$</span>75.00</div></body></html>',
+    '<html><body><script>var t = \'<span class="price">$0.00</span>\';</script>'
+    '<div class="price"><span>$</span>75.00</div></body></html>',
+])
+def test_extract_price_skips_hidden_markup(html):
+    # 价格符号在子元素中，只有文档树遍历能得出结果
+    assert Monitor.extract_price(html) == '$ 75.00'
+
+
+async def _precheck(page: bytes, item: dict = None, etag: str = '"v1"'):
+    """启动本地 HTTP 服务返回给定页面，并对其执行 HTTP 预检查"""
+    async def handler(request):
+        if request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304)
+        return web.Response(body=page, content_type='text/html', headers={'ETag': etag})
+
+    app = web.Application()
+    app.router.add_get('/us/products/578/LABUBU', handler)
+    async with TestServer(app) as server, aiohttp.ClientSession() as session:
+        url = str(server.make_url('/us/products/578/LABUBU'))
+        monitor = Monitor(None, session=session)
+        if item is not None:
+            monitor.monitored_items[url] = item
+        return await monitor._http_precheck(url), monitor._validators.get(url)
+
+
+def test_http_precheck_does_not_parse_price():
+    # 价格只在发送有货通知前提取，预检查不解析页面中的价格
+    result, validators = asyncio.run(_precheck(read_fixture('product_page_in_stock.html')))
+    assert result == (ProductStatus.IN_STOCK, None)
+    assert validators == {'etag': '"v1"', 'page_status': 'in_stock', 'page_price': None}
+
+
+def test_http_precheck_304_uses_page_status():
+    item = {'last_status': 'in_stock', 'etag': '"v1"', 'page_status': 'in_stock', 'page_price': '$75.00'}
+    result, _ = asyncio.run(_precheck(b'', item))
+    assert result == (ProductStatus.IN_STOCK, '$75.00')
+
+
+def test_http_precheck_304_without_page_status():
+    # 页面中没有库存数据时，304 不能说明库存未变化，仍需浏览器检查
+    item = {'last_status': 'sold_out', 'etag': '"v1"', 'page_status': None}
+    result, _ = asyncio.run(_precheck(b'', item))
+    assert result is None
+
+
+def test_button_keywords_are_case_sensitive():
+    # 页面源码中其他大小写的相同短语（如多语言文案）不应判定为售罄
+    assert not Monitor.SOLD_OUT_BUTTON_RE.search('{"notifyMe":"Notify me when available"}')
+    assert Monitor.SOLD_OUT_BUTTON_RE.search(read_fixture('product_page_sold_out.html').decode('utf-8'))
+    assert not Monitor.SOLD_OUT_BUTTON_RE.search(read_fixture('product_page_in_stock.html').decode('utf-8'))
+    assert Monitor.AVAILABLE_BUTTON_RE.search(read_fixture('product_page_in_stock.html').decode('utf-8'))
+
+
+def test_api_in_stock_response():
+    data = _json.loads(read_fixture('product_details_in_stock.json'))
+    # 数字价格不直接使用，交由调用方从页面提取
+    assert Monitor.status_from_api(data) == (ProductStatus.IN_STOCK, None)
+
+
+def test_api_sold_out_response():
+    data = _json.loads(read_fixture('product_details_sold_out.json'))
+    assert Monitor.status_from_api(data) == (ProductStatus.SOLD_OUT, None)
+
+
+@pytest.mark.parametrize('data, expected', [
+    ({'data': {'skus': [{'stock': 1, 'price': '$75.00'}]}}, (ProductStatus.IN_STOCK, '$75.00')),
+    ({'data': {'skus': [{'stock': {'onlineStock': 3}}]}}, None),
+    ({'data': {'skus': []}}, None),
+    ({'code': 'ERROR', 'data': None}, None),
+    ([], None),
+])
+def test_api_response_shapes(data, expected):
+    assert Monitor.status_from_api(data) == expected
+
+
+class ApiMonitor(Monitor):
+    """接口结果固定的监控器"""
+
+    def __init__(self, session, api_result):
+        super().__init__(SimpleNamespace(monitor=SimpleNamespace(max_concurrency=1, request_delay=0)), session=session)
+        self.api_result = api_result
+
+    async def _api_check(self, url):
+        return self.api_result
+
+
+async def _sweep(api_result, last_status, sweeps=1):
+    """对本地商品页执行若干轮检查，返回各轮的通知和页面请求次数"""
+    requests = []
+
+    async def handler(request):
+        requests.append(request.path)
+        return web.Response(body=read_fixture('product_page_in_stock.html'), content_type='text/html')
+
+    app = web.Application()
+    app.router.add_get('/us/products/578/LABUBU', handler)
+    async with TestServer(app) as server, aiohttp.ClientSession() as session:
+        monitor = ApiMonitor(session, api_result)
+        url = str(server.make_url('/us/products/578/LABUBU'))
+        monitor.monitored_items[url] = {'id': '578', 'name': 'LABUBU', 'last_status': last_status}
+        notifications = [await monitor.check_all_items() for _ in range(sweeps)]
+        return notifications, len(requests)
+
+
+def test_precheck_returns_api_result_without_page_fetch():
+    async def run():
+        async with aiohttp.ClientSession() as session:
+            monitor = ApiMonitor(session, (ProductStatus.IN_STOCK, None))
+            return await monitor._precheck('https://example.com/us/products/578/LABUBU')
+
+    assert asyncio.run(run()) == (ProductStatus.IN_STOCK, None)
+
+
+def test_restock_notification_fetches_price_once():
+    notifications, page_requests = asyncio.run(_sweep((ProductStatus.IN_STOCK, None), 'sold_out', sweeps=2))
+    assert [n.price for n in notifications[0]] == ['$75.00']
+    # 第二轮状态未变化，不再下载页面
+    assert notifications[1] == []
+    assert page_requests == 1
+
+
+def test_price_text_from_api_skips_page():
+    notifications, page_requests = asyncio.run(_sweep((ProductStatus.IN_STOCK, '$80.00'), 'sold_out'))
+    assert [n.price for n in notifications[0]] == ['$80.00']
+    assert page_requests == 0
+
+
+def test_sold_out_change_skips_page():
+    notifications, page_requests = asyncio.run(_sweep((ProductStatus.SOLD_OUT, None), 'in_stock'))
+    assert [n.new_status for n in notifications[0]] == [ProductStatus.SOLD_OUT]
+    assert page_requests == 0
+
+
+class PacedMonitor(Monitor):
+    """记录每次 HTTP 预检查开始时间的监控器"""
+
+    def __init__(self, request_delay):
+        super().__init__(SimpleNamespace(monitor=SimpleNamespace(max_concurrency=1, request_delay=request_delay)))
+        self.started = []
+
+    async def _precheck(self, url):
+        self.started.append(time.monotonic())
+        return ProductStatus.SOLD_OUT, None
+
+
+def test_prechecks_are_paced_by_request_delay():
+    monitor = PacedMonitor(0.05)
+    results = asyncio.run(monitor.check_many(('https://example.com/a', 'https://example.com/b', 'https://example.com/c')))
+    assert len(results) == 3
+    gaps = [b - a for a, b in zip(monitor.started, monitor.started[1:])]
+    assert all(gap >= 0.045 for gap in gaps)